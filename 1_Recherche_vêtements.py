@@ -11,16 +11,15 @@ import streamlit as st
 import requests
 import json
 import logging
-import os
-from pytz import timezone
-from typing import Union
-from datetime import datetime
-from operator import itemgetter
-import urllib.request as rq
-from PIL import Image
+from typing import Union, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
-from utils.defines import API_HOST, GET_CLOTHES_ROUTE
-from utils.utils import set_basic_config, get_requests
+from utils.defines import GET_CLOTHES_ROUTE
+from utils.utils import set_basic_config, get_requests, api_request, ApiBalancer
+from utils.profiling import profiled, profiled_rerun, profile_in_thread
+from utils.clothes import Clothe
+from utils.search import ClotheIndex, tokenize
+from utils.thumbnails import get_thumbnail_loader
 
 def run() -> None:
     """
@@ -33,21 +32,37 @@ def run() -> None:
     logging.info("Acquiring clothes")
     st.session_state.run = True
 
-def get_clothes(port: int,
-                selected_requests: list) -> tuple[Union[str, list], list]:
+@st.cache_resource
+def get_last_clothes() -> dict:
+    """
+    Last successful get_clothes response for each request, shared by all sessions.
+    Served instead when the API is down.
+
+    Returns:
+        dict, {JSON request: requests.models.Response}
+    """
+    return {}
+
+def get_clothes(api: ApiBalancer,
+                selected_requests: list) -> tuple[Union[str, list[Clothe]], list]:
     """
     Main function called when we click on the "Chercher vêtements" button.
     Acquires Vinted clothes using our API.
 
     Args:
-        port (int): API port in use
+        api (ApiBalancer): API endpoints in use
         selected_requests (list[str]): list of requests names to apply
 
     Returns:
-        tuple, (clothes, corresponding_requests), (str (in case of error) or list (if the call was successful), list)
+        tuple, (clothes, result_requests), (str (in case of error) or list[Clothe] (if the call was successful),
+        list of applied requests, indexed by Clothe.request_index)
     """
-    corresponding_requests = []
+    result_requests = []
     clothes = []
+    seen_ids = set()
+    st.session_state.index = ClotheIndex()
+    last_clothes = get_last_clothes()
+    st.session_state.stale = False
     try:
 
         # Case no selected request
@@ -55,49 +70,82 @@ def get_clothes(port: int,
             logging.warning("No selected clothes requests")
             # State is not run anymore
             st.session_state.run = False
-            return "Aucune recherche sélectionnée !", corresponding_requests
+            return "Aucune recherche sélectionnée !", result_requests
 
+        # Find the whole requests
+        found_requests = []
         for request_name in selected_requests:
-            # Find the whole request
             found_request = {}
             for request in st.session_state.requests:
                 if request_name == request["name"]:
                     found_request = request
                     break
-            request_clothes = requests.get(f"{API_HOST}:{port}/{GET_CLOTHES_ROUTE}", data=json.dumps(found_request))
-            clothes = format_clothes(clothes, request_clothes)
-            corresponding_requests.extend([found_request] * (len(clothes) - len(corresponding_requests)))
+            found_requests.append(found_request)
+
+        # Call the API for all requests at once, spread over the API endpoints
+        with ThreadPoolExecutor(max_workers=len(found_requests)) as pool:
+            datas = [json.dumps(found_request, sort_keys=True) for found_request in found_requests]
+            futures = [pool.submit(profile_in_thread(api_request), "get", api, GET_CLOTHES_ROUTE, data=data, hedge=True)
+                       for data in datas]
+
+            for request_name, found_request, data, future in zip(selected_requests, found_requests, datas, futures):
+                error = None
+                try:
+                    request_clothes = future.result()
+                    if request_clothes.status_code == 200:
+                        last_clothes[data] = request_clothes
+                    else:
+                        error = f"status {request_clothes.status_code}: {request_clothes.text[:200]}"
+                except requests.exceptions.RequestException as e:
+                    error = e
+
+                if error is not None:
+                    # Serve the last results for this request if we have some, skip it otherwise
+                    if data not in last_clothes:
+                        logging.error(f"API call failed ({error}), skipping request {request_name}")
+                        continue
+                    logging.warning(f"API call failed ({error}), serving last results for request {request_name}")
+                    request_clothes = last_clothes[data]
+                    st.session_state.stale = True
+                result_requests.append(found_request)
+                clothes = format_clothes(clothes, request_clothes, len(result_requests) - 1, seen_ids,
+                                         st.session_state.index)
 
-        # Keep copy of the original order
-        clothes_orig = clothes.copy()
         # Sort clothes by datetime
-        clothes = sorted(clothes, key=itemgetter('created_at_datetime'), reverse=True)
-        # Get the indices of the sorted order from the clothes_orig list
-        indices = [clothes_orig.index(item) for item in clothes]
-        # Finally sort requests the same way
-        corresponding_requests = [corresponding_requests[i] for i in indices]
+        order = sorted(range(len(clothes)), key=lambda i: clothes[i].created_at_datetime, reverse=True)
+        clothes = [clothes[i] for i in order]
+        st.session_state.index.reorder(order)
 
-    except requests.exceptions.ConnectionError:
-        logging.error("API is down! Cannot proceed further")
+    except requests.exceptions.RequestException as e:
+        logging.error(f"API is down! Cannot proceed further: {e}")
+
+    # Only keep AutoBuy history for the displayed clothes
+    st.session_state.autobuy &= seen_ids
 
     # State is not run anymore
     st.session_state.run = False
 
     logging.info(f"Successfully retrieved {len(clothes)} clothes")
 
-    return clothes, corresponding_requests
+    return clothes, result_requests
 
-def format_clothes(clothes: list,
-                   request_clothes: requests.models.Response) -> list:
+def format_clothes(clothes: list[Clothe],
+                   request_clothes: requests.models.Response,
+                   request_index: int,
+                   seen_ids: set,
+                   index: ClotheIndex) -> list[Clothe]:
     """
     Formats clothes from the API response
 
     Args:
-        clothes (list): all the current clothes
+        clothes (list[Clothe]): all the current clothes
         request_clothes (requests.models.Response): API response for the given request
+        request_index (int): index of the given request in the applied requests
+        seen_ids (set): ids of the current clothes, updated with the added ones
+        index (ClotheIndex): full-text index of the current clothes, updated with the added ones
 
     Returns:
-        list, formatted clothes with unique values
+        list[Clothe], formatted clothes with unique values
     """
     request_clothes = json.loads(request_clothes.json()["data"])
     for item in request_clothes:
@@ -105,29 +153,25 @@ def format_clothes(clothes: list,
         if item["created_at_ts"] == "NA":
             logging.warning(f"Encountered item with no picture, skipping: {item}")
             continue
-        # Format str to datetime and apply local time
-        item["created_at_datetime"] = (datetime.strptime(item["created_at_ts"], f"%Y-%m-%dT%H:%M:%S%z")
-                                       .astimezone(timezone("Europe/Brussels")))
-        if item not in clothes:
-            clothes.append(item)
-            st.session_state.autobuy[item["id"]] = False
+        if item["id"] not in seen_ids:
+            clothes.append(Clothe.from_api(item, request_index))
+            seen_ids.add(item["id"])
+            index.add(clothes[-1], len(clothes) - 1)
         else:
             logging.warning(f"Item encountered more than once, skipping: {item}")
 
     return clothes
 
-@st.cache_resource
-def display_clothe(clothe: dict,
-                   request: dict) -> None:
+def display_clothe(clothe: Clothe) -> Optional[tuple]:
     """
-    Given a dict (clothe), displays it on a container
+    Given a clothe, displays it on a container. The image is displayed right away if its thumbnail is ready,
+    otherwise a placeholder is displayed instead.
 
     Args:
-        clothe (dict): formatted clothe
-        request (dict): the corresponding request
+        clothe (Clothe): formatted clothe
 
     Returns:
-        None
+        tuple, (placeholder, thumbnail future) to fill in once the thumbnail is ready, None if already displayed
     """
     logging.info(f"Displaying clothe: {clothe}")
 
@@ -140,25 +184,47 @@ def display_clothe(clothe: dict,
         tiles.append(col.container())
     # Display elements
     # Title - add suspicious photo in case
-    if not clothe["is_photo_suspicious"]:
-        tiles[0].subheader(clothe["title"])
+    if not clothe.is_photo_suspicious:
+        tiles[0].subheader(clothe.title)
     else:
-        tiles[0].subheader(clothe["title"] + " - PHOTO SUSPICIEUSE")
+        tiles[0].subheader(clothe.title + " - PHOTO SUSPICIEUSE")
     # Date, Brand, Size, Status, Price, Favourites, Views
-    tiles[1].markdown(f"**Date:** {clothe['created_at_datetime']}")
-    tiles[1].markdown(f"**Marque:** {clothe['brand_title']}")
-    tiles[1].markdown(f"**Taille:** {clothe['size_title']}")
-    tiles[1].markdown(f"**Etat:** {clothe['status']}")
-    tiles[1].markdown(f"**Prix:** {clothe['total_item_price']} {clothe['currency']}  "
-                      f"({clothe['price_no_fee']} + {clothe['service_fee']} fee)")
-    tiles[1].markdown(f"**Nombre de vues:** {clothe['view_count']}")
-    tiles[1].markdown(f"**Nombre de favoris:** {clothe['favourite_count']}")
-    # Image
-    rq.urlretrieve(clothe["photo_url"], "clothe_image.png")
-    img = Image.open("clothe_image.png")
-    img.thumbnail((400, 400))
-    tiles[2].image(img)
-    os.remove("clothe_image.png")
+    tiles[1].markdown(f"**Date:** {clothe.created_at_datetime}")
+    tiles[1].markdown(f"**Marque:** {clothe.brand_title}")
+    tiles[1].markdown(f"**Taille:** {clothe.size_title}")
+    tiles[1].markdown(f"**Etat:** {clothe.status}")
+    tiles[1].markdown(f"**Prix:** {clothe.total_item_price} {clothe.currency}  "
+                      f"({clothe.price_no_fee} + {clothe.service_fee} fee)")
+    tiles[1].markdown(f"**Nombre de vues:** {clothe.view_count}")
+    tiles[1].markdown(f"**Nombre de favoris:** {clothe.favourite_count}")
+    # Image - cached thumbnail, built in background
+    thumbnail = get_thumbnail_loader().get(clothe.id, clothe.photo_url, clothe.photo_variant_url)
+    placeholder = tiles[2].empty()
+
+    if thumbnail.done():
+        fill_image(placeholder, thumbnail)
+        return None
+
+    placeholder.caption("Chargement de l'image...")
+
+    return placeholder, thumbnail
+
+def fill_image(placeholder,
+               thumbnail: Future) -> None:
+    """
+    Displays a thumbnail in its placeholder, waiting for it if needed
+
+    Args:
+        placeholder (DeltaGenerator): st.empty placeholder of the image
+        thumbnail (Future): thumbnail future from the ThumbnailLoader
+
+    Returns:
+        None
+    """
+    if thumbnail.result() is not None:
+        placeholder.image(thumbnail.result())
+    else:
+        placeholder.caption("Image indisponible")
 
 def autobuy(clothe, request):
     """
@@ -171,14 +237,90 @@ def autobuy(clothe, request):
     Returns:
 
     """
-    st.session_state.autobuy[clothe["id"]] = True
+    st.session_state.autobuy.add(clothe.id)
+
+@st.fragment
+@profiled_rerun
+def display_card(clothe: Clothe,
+                 request: dict) -> None:
+    """
+    Displays a clothe with its actions. Interacting with them only reruns this card.
+
+    Args:
+        clothe (Clothe): formatted clothe
+        request (dict): the corresponding request
+
+    Returns:
+        None
+    """
+    pending_image = display_clothe(clothe)
+    # Format last elements nicely
+    row = st.columns(1) + st.columns(2)
+    # Button link URL
+    row[0].link_button('Voir sur Vinted', clothe.url)
+    # Corresponding request name
+    row[1].markdown(f"**Via recherche:** {request['name']}")
+    # Autobuy
+    row[2].button('AutoBuy',
+                  type="primary",
+                  key=str(clothe.id),
+                  on_click=autobuy,
+                  args=(clothe, request),
+                  disabled=clothe.id in st.session_state.autobuy)
+
+    if pending_image is not None:
+        if st.session_state.pending_images is not None:
+            # Whole grid is being displayed, the image will be filled in with the others
+            st.session_state.pending_images.append(pending_image)
+        else:
+            # Only this card is rerun
+            fill_image(*pending_image)
+
+@st.fragment
+@profiled_rerun
+def display_results() -> None:
+    """
+    Displays the found clothes on 2 columns, without rerunning the whole page (and calling the API).
+    All the cards texts are displayed first, then images are filled in as soon as they are ready.
+    Clothes can be filtered on title, brand and size using the index built in format_clothes.
+
+    Returns:
+        None
+    """
+    query = st.text_input("Filtrer les résultats",
+                          help="Début des mots du titre, de la marque ou de la taille",
+                          key="query")
+
+    clothes = st.session_state.result
+    # Queries without any word (e.g. "-") don't filter
+    if tokenize(query):
+        clothes = [clothes[position] for position in st.session_state.index.search(query)]
+        st.caption(f"{len(clothes)} / {len(st.session_state.result)} articles")
+
+    st.session_state.pending_images = []
+
+    try:
+        col1, col2 = st.columns(2)
+        cols = [col1, col2]
+        for c, clothe in enumerate(clothes):
+            with cols[c % 2]:
+                with st.container(border=True):
+                    display_card(clothe, st.session_state.result_requests[clothe.request_index])
+
+        placeholders = {thumbnail: placeholder for placeholder, thumbnail in st.session_state.pending_images}
+
+    finally:
+        st.session_state.pending_images = None
+
+    for thumbnail in as_completed(placeholders):
+        fill_image(placeholders[thumbnail], thumbnail)
 
-def main(port: int) -> None:
+def main(api: ApiBalancer) -> None:
     """
     Main function running this page.
 
     Args:
-        port (int): API port to use
+        api (ApiBalancer): API endpoints to use
 
     Returns:
         None
@@ -189,17 +331,23 @@ def main(port: int) -> None:
         st.session_state.run = False
         # Found clothes
         st.session_state.result = None
-        # Corresponding clothes requests for each clothe
-        st.session_state.corresponding_requests = None
+        # Requests applied for the found clothes, indexed by Clothe.request_index
+        st.session_state.result_requests = None
         # All the requests found in MongoDB
         st.session_state.requests = None
         # Current selected requests in the selector
         st.session_state.selected_requests = None
-        # Activate or not autobuy button
-        st.session_state.autobuy = {}
+        # Ids of the displayed clothes whose autobuy button was clicked
+        st.session_state.autobuy = set()
+        # Whether displayed clothes come from the last cached results because the API is down
+        st.session_state.stale = False
+        # Images to fill in once the whole grid is displayed, None when only a card is rerun
+        st.session_state.pending_images = None
+        # Full-text index of the found clothes
+        st.session_state.index = ClotheIndex()
 
     # get all the available requests
-    _ = get_requests(port)
+    _ = get_requests(api)
 
     if st.session_state.requests:
         # Requests selector
@@ -218,7 +366,7 @@ def main(port: int) -> None:
         # Also keep track of selected requests
         if st.session_state.run:
             st.session_state.selected_requests = selected_requests
-            st.session_state.result, st.session_state.corresponding_requests = get_clothes(port, selected_requests)
+            st.session_state.result, st.session_state.result_requests = get_clothes(api, selected_requests)
             st.rerun()
 
         # Once we finish getting clothes (successful or not), we need to rewrite them since we rerun the app
@@ -228,33 +376,15 @@ def main(port: int) -> None:
                 st.write(st.session_state.result)
 
             else:
+                if st.session_state.stale:
+                    st.warning("L'API ne répond pas, affichage des derniers résultats connus.")
                 # Case call successful - display everything on 2 columns
-                col1, col2 = st.columns(2)
-                cols = [col1, col2]
-                c = 0
-                for clothe, request in zip(st.session_state.result, st.session_state.corresponding_requests):
-                    with cols[c % 2]:
-                        with st.container(border=True):
-                            # Cache clothes display
-                            display_clothe(clothe, request)
-                            # Format last elements nicely
-                            row = st.columns(1) + st.columns(2)
-                            # Button link URL
-                            row[0].link_button('Voir sur Vinted', clothe["url"])
-                            # Corresponding request name
-                            row[1].markdown(f"**Via recherche:** {request['name']}")
-                            # Autobuy
-                            row[2].button('AutoBuy',
-                                            type="primary",
-                                            key=str(clothe["id"]),
-                                            on_click=autobuy,
-                                            args=(clothe, request),
-                                            disabled=st.session_state.autobuy[clothe["id"]])
-                            c += 1
+                display_results()
 
 
 if __name__ == '__main__':
-    api_port, _ = set_basic_config("Recherche vêtements")
+    api, _, profile = set_basic_config("Recherche vêtements")
     # To deactivate button in page "Edition requêtes"
     st.session_state.not_modified = True
-    main(api_port)
+    with profiled(profile, "Recherche vêtements"):
+        main(api)
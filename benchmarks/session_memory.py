@@ -0,0 +1,145 @@
+###############################################################################
+#
+# File:      session_memory.py
+# Author(s): Nico
+# Scope:     Benchmark of the per-session memory used by found clothes
+#
+# Created:   19 October 2026
+#
+###############################################################################
+import argparse
+import json
+import tracemalloc
+from datetime import datetime
+from pytz import timezone
+
+from utils.clothes import Clothe
+from utils.search import ClotheIndex
+
+
+def fake_item(i: int) -> dict:
+    """
+    Builds a clothe as returned by the API, with the displayed fields and the other usual Vinted fields
+
+    Args:
+        i (int): clothe id
+
+    Returns:
+        dict, the raw clothe
+    """
+    return {
+        "id": 3000000000 + i,
+        "title": f"Sweat à capuche vintage taille M numéro {i}",
+        "is_photo_suspicious": False,
+        "created_at_ts": "2024-01-29T12:34:56+00:00",
+        "brand_title": "Carhartt",
+        "size_title": "M",
+        "status": "Très bon état",
+        "total_item_price": "25.45",
+        "currency": "EUR",
+        "price_no_fee": "23.00",
+        "service_fee": "2.45",
+        "view_count": i % 300,
+        "favourite_count": i % 40,
+        "photo_url": f"https://images1.vinted.net/t/01_00a1b_{i:012d}/f800/1706531696.jpeg",
+        "url": f"https://www.vinted.fr/items/{3000000000 + i}-sweat-a-capuche-vintage",
+        "user_id": 100000 + i,
+        "user_login": f"seller_{i}",
+        "user_profile_url": f"https://www.vinted.fr/member/{100000 + i}",
+        "photo_high_resolution": {"id": f"01_00a1b_{i:012d}", "timestamp": 1706531696, "orientation": None},
+        "photo": {"thumbnails": [{"type": size, "url": f"https://images1.vinted.net/t/01_00a1b_{i:012d}/{size}.jpeg"}
+                                 for size in ("thumb70x100", "thumb150x210", "thumb310x430", "thumb428x624")]},
+        "is_visible": 1,
+        "promoted": False,
+        "content_source": "search",
+        "search_tracking_params": {"score": 0.123456, "matched_queries": ["carhartt", "sweat"]},
+    }
+
+
+def raw_session(items: list[dict], request: dict) -> tuple:
+    """
+    Session state as previously kept: raw clothes, one request reference per clothe, autobuy for every clothe
+
+    Args:
+        items (list[dict]): raw clothes
+        request (dict): the applied request
+
+    Returns:
+        tuple, (result, corresponding_requests, autobuy)
+    """
+    result = []
+    for item in items:
+        # Own copy of every field, as parsed from the API response
+        item = json.loads(json.dumps(item))
+        item["created_at_datetime"] = (datetime.strptime(item["created_at_ts"], f"%Y-%m-%dT%H:%M:%S%z")
+                                       .astimezone(timezone("Europe/Brussels")))
+        result.append(item)
+    return result, [request] * len(result), {item["id"]: False for item in result}
+
+
+def compact_session(items: list[dict], request: dict) -> tuple:
+    """
+    Session state as now kept: Clothe records, applied requests, autobuy for clicked clothes only
+
+    Args:
+        items (list[dict]): raw clothes
+        request (dict): the applied request
+
+    Returns:
+        tuple, (result, result_requests, autobuy)
+    """
+    return [Clothe.from_api(json.loads(json.dumps(item)), 0) for item in items], [request], set()
+
+
+def build_index(result: list[Clothe]) -> ClotheIndex:
+    """
+    Full-text index of the found clothes, also kept in session state
+
+    Args:
+        result (list[Clothe]): found clothes
+
+    Returns:
+        ClotheIndex, the index
+    """
+    index = ClotheIndex()
+    for position, clothe in enumerate(result):
+        index.add(clothe, position)
+    return index
+
+
+def measure(build, *args) -> int:
+    """
+    Measures the memory allocated by a session state builder
+
+    Args:
+        build (Callable): session state builder
+        args: builder arguments
+
+    Returns:
+        int, allocated bytes still held by the built session state
+    """
+    tracemalloc.start()
+    state = build(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-session memory of found clothes")
+    parser.add_argument("-n", "--clothes", type=int, default=1000, help="Number of clothes per session")
+    args = parser.parse_args()
+
+    request = {"_id": "65b7a1", "name": "DEFAULT", "per_page": 96, "search_text": "sweat", "brand_ids": "362",
+               "status_ids": "6,1,2", "price_from": "", "price_to": "30", "state": "active"}
+    items = [fake_item(i) for i in range(args.clothes)]
+
+    raw = measure(raw_session, items, request)
+    compact = measure(compact_session, items, request)
+    index = measure(build_index, compact_session(items, request)[0])
+
+    print(f"{args.clothes} clothes per session")
+    print(f"raw dicts:       {raw / 1024:8.1f} KiB ({raw / args.clothes:6.0f} B/clothe)")
+    print(f"compact records: {compact / 1024:8.1f} KiB ({compact / args.clothes:6.0f} B/clothe)")
+    print(f"full-text index: {index / 1024:8.1f} KiB ({index / args.clothes:6.0f} B/clothe)")
@@ -11,12 +11,12 @@ import streamlit as st
 from streamlit_js_eval import streamlit_js_eval
 import pandas as pd
 import logging
-import requests
 import json
 
-from utils.utils import set_basic_config, get_requests
+from utils.utils import set_basic_config, get_requests, api_request, ApiBalancer
+from utils.profiling import profiled
 from utils.defines import (MAPPER_REQUESTS, MAPPER_STATUS_IDS, STATUS_IDS_KEY, BRAND_IDS_KEY, CONFIG, BRANDS,
-                           API_HOST, UPDATE_REQUESTS_ROUTE)
+                           UPDATE_REQUESTS_ROUTE)
 
 
 def display_requests() -> None:
@@ -210,12 +210,12 @@ def format_requests_back() -> None:
 
     logging.info(f"Requests successfully formatted: {st.session_state.requests_to_be_saved}")
 
-def save_requests(port: int) -> None:
+def save_requests(api: ApiBalancer) -> None:
     """
     Performs the saving of requests in DB after formatting them
 
     Args:
-        port (int): API port in use
+        api (ApiBalancer): API endpoints in use
 
     Returns:
         None
@@ -225,7 +225,7 @@ def save_requests(port: int) -> None:
         format_requests_back()
 
         # Call the API
-        r = requests.post(f"{API_HOST}:{port}/{UPDATE_REQUESTS_ROUTE}", data=json.dumps(st.session_state.requests_to_be_saved))
+        r = api_request("post", api, UPDATE_REQUESTS_ROUTE, data=json.dumps(st.session_state.requests_to_be_saved))
 
         if r.status_code == 200:
             logging.info("Requests updated successfully, reloading page")
@@ -241,12 +241,12 @@ def save_requests(port: int) -> None:
         logging.error(f"An error occurred while saving requests: {e}")
 
 
-def main(port: int) -> None:
+def main(api: ApiBalancer) -> None:
     """
     Main function running this page.
 
     Args:
-        port (int): API port in use
+        api (ApiBalancer): API endpoints in use
 
     Returns:
         None
@@ -264,7 +264,7 @@ def main(port: int) -> None:
         st.session_state.requests_to_be_saved = None
 
     # Display only if everything is OK or if we have no requests in DB
-    if st.session_state.displayed is None and get_requests(port, False):
+    if st.session_state.displayed is None and get_requests(api, False):
         display_requests()
 
     if st.session_state.displayed is not None:
@@ -286,9 +286,10 @@ def main(port: int) -> None:
                   disabled=st.session_state.not_modified)
 
         if st.session_state.run_save:
-            save_requests(port)
+            save_requests(api)
 
 
 if __name__ == '__main__':
-    api_port, _ = set_basic_config("Edition requêtes")
-    main(api_port)
+    api, _, profile = set_basic_config("Edition requêtes")
+    with profiled(profile, "Edition requêtes"):
+        main(api)
@@ -0,0 +1,93 @@
+###############################################################################
+#
+# File:      clothes.py
+# Author(s): Nico
+# Scope:     Compact representation of the clothes kept in session state
+#
+# Created:   19 October 2026
+#
+###############################################################################
+from dataclasses import dataclass
+from datetime import datetime
+from pytz import timezone
+from typing import Optional
+
+from utils.defines import PHOTO_VARIANT_TYPE
+
+
+def variant_url(item: dict) -> Optional[str]:
+    """
+    Gets the URL of the smaller photo variant from the Vinted photo thumbnails, when the API gives them
+
+    Args:
+        item (dict): raw clothe returned by the API
+
+    Returns:
+        str, smaller variant URL, None if not found
+    """
+    photo = item.get("photo") or {}
+
+    for thumbnail in photo.get("thumbnails") or []:
+        if thumbnail.get("type") == PHOTO_VARIANT_TYPE:
+            return thumbnail.get("url")
+
+    return None
+
+
+@dataclass(slots=True)
+class Clothe:
+    """
+    Clothe found by the API, holding only the displayed fields.
+    request_index is the index of the corresponding request in st.session_state.result_requests.
+    """
+    id: int
+    request_index: int
+    title: str
+    is_photo_suspicious: bool
+    created_at_datetime: datetime
+    brand_title: str
+    size_title: str
+    status: str
+    total_item_price: str
+    currency: str
+    price_no_fee: str
+    service_fee: str
+    view_count: int
+    favourite_count: int
+    photo_url: str
+    photo_variant_url: Optional[str]
+    url: str
+
+    @classmethod
+    def from_api(cls,
+                 item: dict,
+                 request_index: int) -> "Clothe":
+        """
+        Builds a Clothe from a raw API item, dropping the fields we don't display
+
+        Args:
+            item (dict): raw clothe returned by the API
+            request_index (int): index of the request which found this clothe
+
+        Returns:
+            Clothe, the compact clothe
+        """
+        return cls(id=item["id"],
+                   request_index=request_index,
+                   title=item["title"],
+                   is_photo_suspicious=item["is_photo_suspicious"],
+                   # Format str to datetime and apply local time
+                   created_at_datetime=(datetime.strptime(item["created_at_ts"], f"%Y-%m-%dT%H:%M:%S%z")
+                                        .astimezone(timezone("Europe/Brussels"))),
+                   brand_title=item["brand_title"],
+                   size_title=item["size_title"],
+                   status=item["status"],
+                   total_item_price=item["total_item_price"],
+                   currency=item["currency"],
+                   price_no_fee=item["price_no_fee"],
+                   service_fee=item["service_fee"],
+                   view_count=item["view_count"],
+                   favourite_count=item["favourite_count"],
+                   photo_url=item["photo_url"],
+                   photo_variant_url=variant_url(item),
+                   url=item["url"])
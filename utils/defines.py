@@ -11,8 +11,36 @@ import streamlit as st
 from datetime import datetime
 
 
-# API Host (port handled in entry point parameters)
+# API Host (port handled in entry point parameters, several endpoints can also be given with --api)
 API_HOST = "http://127.0.0.1"
+# How calls are spread over API endpoints: "round_robin" or "least_outstanding"
+API_BALANCING = "least_outstanding"
+# Route used to check endpoints health (any answer below 500 means up) and interval (seconds) - None to disable
+API_HEALTH_CHECK_ROUTE = "docs"
+API_HEALTH_CHECK_INTERVAL = 10
+# API connect and read timeouts (seconds)
+API_CONNECT_TIMEOUT = 3.05
+API_READ_TIMEOUT = 30
+# Number of retries for a failed API call, waiting API_BACKOFF_FACTOR * 2 ** (retry - 1) seconds between them
+API_RETRIES = 2
+API_BACKOFF_FACTOR = 0.5
+# Send a second get_clothes call if the first one did not answer after this delay (seconds) - None to disable
+HEDGE_DELAY = 10
+# Number of consecutive API failures before failing fast, and time (seconds) before trying the API again
+CIRCUIT_BREAKER_FAILURES = 3
+CIRCUIT_BREAKER_COOLDOWN = 30
+# Clothes thumbnails: max size (px), format ("WEBP" or "JPEG") and quality (1-100)
+THUMBNAIL_SIZE = (400, 400)
+THUMBNAIL_FORMAT = "WEBP"
+THUMBNAIL_QUALITY = 80
+# Maximum number of thumbnails kept in cache (shared by all sessions) and threads building them
+THUMBNAIL_CACHE_ENTRIES = 2000
+THUMBNAIL_WORKERS = 8
+# Type of the smaller photo variant to download first, when the API gives the Vinted photo thumbnails
+PHOTO_VARIANT_TYPE = "thumb310x430"
+# Photos download connect and read timeouts (seconds)
+PHOTO_CONNECT_TIMEOUT = 2
+PHOTO_READ_TIMEOUT = 5
 # Route to get_clothes
 GET_CLOTHES_ROUTE = "api/operations/get_clothes"
 # Route to get_requests
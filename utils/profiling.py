@@ -0,0 +1,120 @@
+###############################################################################
+#
+# File:      profiling.py
+# Author(s): Nico
+# Scope:     Profile page runs, including the threads they start and fragment reruns
+#
+# Created:   19 October 2026
+#
+###############################################################################
+import streamlit as st
+import logging
+import cProfile
+import pstats
+import threading
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+
+# Profiles of the threads working for the page run in progress in the current thread
+current = threading.local()
+
+
+@contextmanager
+def profiled(profile_dir: str,
+             name: str):
+    """
+    Profiles a page run with cProfile and writes the stats in profile_dir (e.g. for snakeviz or flameprof).
+    Functions submitted to threads with profile_in_thread are profiled too and merged in the same file.
+    Does nothing if profile_dir is None or if a run is already being profiled in this thread.
+
+    Args:
+        profile_dir (str): folder to write the profiles to
+        name (str): name of the profiled page or fragment
+
+    Returns:
+        None
+    """
+    if profile_dir is None or getattr(current, "profiles", None) is not None:
+        yield
+        return
+
+    profiles = []
+    current.profiles = profiles
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    try:
+        yield
+
+    finally:
+        # Also reached on st.rerun(), which raises
+        profiler.disable()
+        current.profiles = None
+
+        stats = pstats.Stats(profiler)
+        for thread_profiler in list(profiles):
+            try:
+                stats.add(thread_profiler)
+            except TypeError:
+                # Nothing was profiled in this thread
+                pass
+
+        os.makedirs(profile_dir, exist_ok=True)
+        path = os.path.join(profile_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.prof")
+        stats.dump_stats(path)
+        logging.info(f"Profile written to {path}")
+
+
+def profile_in_thread(func):
+    """
+    Wraps a function to be submitted to another thread, so that it is profiled with the current page run.
+    Returns func unchanged if no run is being profiled.
+
+    Args:
+        func (Callable): function to run in another thread
+
+    Returns:
+        Callable, the wrapped function
+    """
+    profiles = getattr(current, "profiles", None)
+
+    if profiles is None:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = cProfile.Profile()
+        # Functions submitted from this thread are profiled as well
+        current.profiles = profiles
+        profiler.enable()
+
+        try:
+            return func(*args, **kwargs)
+
+        finally:
+            profiler.disable()
+            current.profiles = None
+            profiles.append(profiler)
+
+    return wrapper
+
+
+def profiled_rerun(func):
+    """
+    Decorator profiling each rerun of a fragment, in the folder given with --profile
+
+    Args:
+        func (Callable): fragment function
+
+    Returns:
+        Callable, the wrapped function
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiled(st.session_state.get("profile_dir"), func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
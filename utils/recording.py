@@ -0,0 +1,104 @@
+###############################################################################
+#
+# File:      recording.py
+# Author(s): Nico
+# Scope:     Record API calls to a file and replay them in place of the API
+#
+# Created:   19 October 2026
+#
+###############################################################################
+import logging
+import requests
+import json
+import threading
+import os
+
+
+class ApiTape:
+    """
+    JSON lines file of API calls. In "record" mode, every call and its response are appended to it.
+    In "replay" mode, recorded responses are served back for the same calls, in the recorded order
+    (starting over once all of them have been served).
+    """
+    def __init__(self,
+                 path: str,
+                 mode: str) -> None:
+        self.path = path
+        self.mode = mode
+        self.lock = threading.Lock()
+        # {(method, route, data): [recorded calls]} and index of the next one to serve
+        self.calls = {}
+        self.served = {}
+
+        if mode == "replay":
+            with open(path) as f:
+                for line in f:
+                    call = json.loads(line)
+                    self.calls.setdefault((call["method"], call["route"], call["data"]), []).append(call)
+            logging.info(f"Replaying {sum(len(calls) for calls in self.calls.values())} API calls from {path}")
+
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def record(self,
+               method: str,
+               route: str,
+               data: str,
+               response: requests.models.Response) -> None:
+        """
+        Appends an API call and its response to the file
+
+        Args:
+            method (str): HTTP method
+            route (str): API route called
+            data (str): JSON body sent
+            response (requests.models.Response): API response
+
+        Returns:
+            None
+        """
+        call = {"method": method,
+                "route": route,
+                "data": data,
+                "status_code": response.status_code,
+                "content": response.text,
+                "elapsed": response.elapsed.total_seconds()}
+
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(call) + "\n")
+
+    def replay(self,
+               method: str,
+               route: str,
+               data: str) -> requests.models.Response:
+        """
+        Serves the next recorded response for an API call
+
+        Args:
+            method (str): HTTP method
+            route (str): API route called
+            data (str): JSON body sent
+
+        Returns:
+            requests.models.Response, the recorded response
+
+        Raises:
+            requests.exceptions.ConnectionError, if this call was never recorded
+        """
+        key = (method, route, data)
+
+        with self.lock:
+            if key not in self.calls:
+                raise requests.exceptions.ConnectionError(f"No recorded response for {method} {route}: {data}")
+
+            calls = self.calls[key]
+            call = calls[self.served.get(key, 0) % len(calls)]
+            self.served[key] = self.served.get(key, 0) + 1
+
+        response = requests.models.Response()
+        response.status_code = call["status_code"]
+        response._content = call["content"].encode("utf-8")
+        response.encoding = "utf-8"
+
+        return response
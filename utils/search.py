@@ -0,0 +1,114 @@
+###############################################################################
+#
+# File:      search.py
+# Author(s): Nico
+# Scope:     In-memory full-text index to filter found clothes without calling the API
+#
+# Created:   19 October 2026
+#
+###############################################################################
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from utils.clothes import Clothe
+
+
+# Indexed Clothe fields
+INDEXED_FIELDS = ("title", "brand_title", "size_title")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits a text into lowercase words without accents
+
+    Args:
+        text (str): text to split
+
+    Returns:
+        list[str], words of the text
+    """
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+
+    return re.findall(r"\w+", text)
+
+
+class ClotheIndex:
+    """
+    Inverted index over INDEXED_FIELDS: sorted words (for prefix matching) and, for each of them,
+    the sorted positions in st.session_state.result of the clothes containing it
+    """
+    def __init__(self) -> None:
+        self.words = []
+        self.positions = []
+
+    def add(self,
+            clothe: Clothe,
+            position: int) -> None:
+        """
+        Indexes a clothe. Clothes must be added in increasing positions.
+
+        Args:
+            clothe (Clothe): clothe to index
+            position (int): position of the clothe in the results
+
+        Returns:
+            None
+        """
+        for field in INDEXED_FIELDS:
+            # Missing brand or size must not be indexed as "none"
+            if not getattr(clothe, field):
+                continue
+            for word in tokenize(getattr(clothe, field)):
+                i = bisect_left(self.words, word)
+                if i < len(self.words) and self.words[i] == word:
+                    if self.positions[i][-1] != position:
+                        self.positions[i].append(position)
+                else:
+                    self.words.insert(i, word)
+                    self.positions.insert(i, array("I", [position]))
+
+    def reorder(self,
+                order: list[int]) -> None:
+        """
+        Updates positions once the results have been reordered
+
+        Args:
+            order (list[int]): previous position of each clothe, in the new order
+
+        Returns:
+            None
+        """
+        new_positions = array("I", bytes(4 * len(order)))
+        for new, old in enumerate(order):
+            new_positions[old] = new
+
+        self.positions = [array("I", sorted(new_positions[position] for position in positions))
+                          for positions in self.positions]
+
+    def search(self,
+               query: str) -> list[int]:
+        """
+        Finds clothes matching every word of the query, each query word being the beginning of an indexed word
+
+        Args:
+            query (str): text typed by the user
+
+        Returns:
+            list[int], sorted positions of the matching clothes (empty if the query has no word)
+        """
+        found = None
+
+        for prefix in tokenize(query):
+            matching = set()
+            start = bisect_left(self.words, prefix)
+            for positions in self.positions[start:bisect_left(self.words, prefix + chr(0x10FFFF))]:
+                matching.update(positions)
+
+            found = matching if found is None else found & matching
+            if not found:
+                return []
+
+        return sorted(found) if found is not None else []
@@ -0,0 +1,105 @@
+###############################################################################
+#
+# File:      thumbnails.py
+# Author(s): Nico
+# Scope:     Download clothes photos and build their thumbnails in background threads
+#
+# Created:   19 October 2026
+#
+###############################################################################
+import streamlit as st
+import logging
+import requests
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, Future
+from cachetools import LRUCache
+from PIL import Image
+
+from utils.profiling import profile_in_thread
+from utils.defines import (PHOTO_CONNECT_TIMEOUT, PHOTO_READ_TIMEOUT, THUMBNAIL_SIZE, THUMBNAIL_FORMAT,
+                           THUMBNAIL_QUALITY, THUMBNAIL_CACHE_ENTRIES, THUMBNAIL_WORKERS)
+
+
+class ThumbnailLoader:
+    """
+    Builds thumbnails once per clothe id and keeps the last THUMBNAIL_CACHE_ENTRIES of them
+    """
+    def __init__(self) -> None:
+        self.pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+        self.thumbnails = LRUCache(maxsize=THUMBNAIL_CACHE_ENTRIES)
+        self.lock = threading.Lock()
+
+    def get(self,
+            clothe_id: int,
+            photo_url: str,
+            variant_url: str = None) -> Future:
+        """
+        Gets the thumbnail of a clothe, starting to build it if needed
+
+        Args:
+            clothe_id (int): clothe id, used as cache key
+            photo_url (str): full-size photo URL
+            variant_url (str): smaller photo variant URL, if any
+
+        Returns:
+            Future, resolving to the thumbnail bytes, or None if the photo could not be downloaded
+        """
+        with self.lock:
+            future = self.thumbnails.get(clothe_id)
+            # Retry failed downloads
+            if future is None or (future.done() and future.result() is None):
+                future = self.pool.submit(profile_in_thread(build_thumbnail), photo_url, variant_url)
+                self.thumbnails[clothe_id] = future
+
+        return future
+
+
+@st.cache_resource
+def get_thumbnail_loader() -> ThumbnailLoader:
+    """
+    Thumbnail loader shared by all sessions
+
+    Returns:
+        ThumbnailLoader, the shared loader
+    """
+    return ThumbnailLoader()
+
+
+def build_thumbnail(photo_url: str,
+                    variant_url: str = None) -> bytes:
+    """
+    Downloads a photo (smaller variant first, if any) and shrinks it to THUMBNAIL_SIZE in THUMBNAIL_FORMAT
+
+    Args:
+        photo_url (str): full-size photo URL
+        variant_url (str): smaller photo variant URL, if any
+
+    Returns:
+        bytes, encoded thumbnail, or None if the photo could not be downloaded
+    """
+    urls = [variant_url, photo_url] if variant_url else [photo_url]
+
+    for url in urls:
+        try:
+            r = requests.get(url, timeout=(PHOTO_CONNECT_TIMEOUT, PHOTO_READ_TIMEOUT))
+            if r.status_code != 200:
+                logging.warning(f"Could not download photo {url}: status {r.status_code}")
+                continue
+
+            img = Image.open(BytesIO(r.content))
+            # Let JPEG decode directly at a reduced scale
+            img.draft("RGB", THUMBNAIL_SIZE)
+            img.thumbnail(THUMBNAIL_SIZE)
+            if THUMBNAIL_FORMAT == "JPEG" and img.mode != "RGB":
+                img = img.convert("RGB")
+
+            thumbnail = BytesIO()
+            img.save(thumbnail, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+
+            return thumbnail.getvalue()
+
+        except Exception as e:
+            logging.warning(f"Could not build thumbnail from {url}: {e}")
+
+    return None
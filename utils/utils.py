@@ -14,10 +14,371 @@ import json
 import argparse
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
 
-from utils.defines import API_HOST, GET_REQUESTS_ROUTE
+from utils.defines import (API_HOST, GET_REQUESTS_ROUTE, API_CONNECT_TIMEOUT, API_READ_TIMEOUT, API_RETRIES,
+                           API_BACKOFF_FACTOR, HEDGE_DELAY, CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_COOLDOWN,
+                           API_BALANCING, API_HEALTH_CHECK_ROUTE, API_HEALTH_CHECK_INTERVAL)
+from utils.recording import ApiTape
+from utils.profiling import profile_in_thread
 
-def set_basic_config(page_name: str) -> tuple[int, str]:
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling the API while the circuit breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive API failures. Once max_failures is reached, calls fail fast during cooldown seconds,
+    then a single trial call is let through to check whether the API is back.
+    """
+    def __init__(self,
+                 max_failures: int,
+                 cooldown: float) -> None:
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Whether a call to the API can be made
+
+        Returns:
+            bool, False if the circuit is open
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half-open: let this call through, the next ones fail fast until it succeeds or fails
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """
+        Closes the circuit after a successful call
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        """
+        Counts a failed call, and opens the circuit once max_failures consecutive calls failed
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.max_failures:
+                if self.opened_at is None:
+                    logging.error(f"API failed {self.failures} times in a row, opening circuit breaker")
+                self.opened_at = time.monotonic()
+
+
+def make_api_session() -> requests.Session:
+    """
+    HTTP session keeping connections alive and retrying failed calls with backoff.
+    Read timeouts are never retried, so a stalled call fails after API_READ_TIMEOUT. Bad gateway statuses
+    are only retried for GET since POST calls modify the DB.
+
+    Returns:
+        requests.Session, the new session
+    """
+    retry = Retry(total=API_RETRIES,
+                  read=0,
+                  backoff_factor=API_BACKOFF_FACTOR,
+                  status_forcelist=[502, 503, 504],
+                  allowed_methods=["GET"],
+                  raise_on_status=False)
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(max_retries=retry))
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+
+    return session
+
+
+class Backend:
+    """
+    API endpoint, with its own circuit breaker, health and number of calls in progress
+    """
+    def __init__(self,
+                 url: str) -> None:
+        self.url = url
+        self.breaker = CircuitBreaker(CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_COOLDOWN)
+        self.healthy = True
+        self.outstanding = 0
+
+
+class ApiBalancer:
+    """
+    Spreads API calls over several endpoints, using round-robin or least-outstanding-requests (API_BALANCING).
+    Endpoints failing their health check or with an open circuit breaker are only used if no other one is left.
+    Calls are recorded to, or replayed from, tape if given.
+    """
+    def __init__(self,
+                 urls: tuple,
+                 tape: ApiTape = None) -> None:
+        self.backends = [Backend(url) for url in urls]
+        self.next = 0
+        self.lock = threading.Lock()
+        self.tape = tape
+        # Created once here since API calls are made from threads without Streamlit context
+        self.session = make_api_session()
+
+        # No need to check endpoints when replaying
+        if API_HEALTH_CHECK_INTERVAL is not None and (tape is None or tape.mode != "replay"):
+            threading.Thread(target=self.health_check, daemon=True).start()
+
+    def ordered(self) -> list[Backend]:
+        """
+        Gets the endpoints in the order they should be tried
+
+        Returns:
+            list[Backend], endpoints to try
+        """
+        with self.lock:
+            # Rotate the start to break ties
+            backends = self.backends[self.next:] + self.backends[:self.next]
+            self.next = (self.next + 1) % len(self.backends)
+
+            if API_BALANCING == "least_outstanding":
+                backends.sort(key=lambda backend: backend.outstanding)
+
+        # Healthy ones first (stable sort)
+        return sorted(backends, key=lambda backend: not backend.healthy)
+
+    def acquire(self,
+                exclude: list = ()) -> Backend:
+        """
+        Picks an endpoint for a call, to be released once it is done
+
+        Args:
+            exclude (list[Backend]): endpoints not to use (already failed for this call)
+
+        Returns:
+            Backend, the picked endpoint
+
+        Raises:
+            CircuitOpenError, if no endpoint can be tried (excluded or circuit breaker open)
+        """
+        for backend in self.ordered():
+            if backend not in exclude and backend.breaker.allow():
+                with self.lock:
+                    backend.outstanding += 1
+                return backend
+
+        raise CircuitOpenError("No API endpoint can be tried, circuit breakers open")
+
+    def release(self,
+                backend: Backend) -> None:
+        """
+        Releases an endpoint picked with acquire once its call is done
+
+        Args:
+            backend (Backend): the endpoint to release
+
+        Returns:
+            None
+        """
+        with self.lock:
+            backend.outstanding -= 1
+
+    def health_check(self) -> None:
+        """
+        Checks every API_HEALTH_CHECK_INTERVAL seconds that each endpoint answers (any status below 500)
+
+        Returns:
+            None
+        """
+        while True:
+            for backend in self.backends:
+                try:
+                    r = requests.get(f"{backend.url}/{API_HEALTH_CHECK_ROUTE}",
+                                     timeout=(API_CONNECT_TIMEOUT, API_CONNECT_TIMEOUT))
+                    healthy = r.status_code < 500
+                except requests.exceptions.RequestException:
+                    healthy = False
+
+                if healthy != backend.healthy:
+                    logging.warning(f"API endpoint {backend.url} is now {'up' if healthy else 'down'}")
+                backend.healthy = healthy
+
+            time.sleep(API_HEALTH_CHECK_INTERVAL)
+
+
+@st.cache_resource
+def get_api_balancer(urls: tuple,
+                     record: str = None,
+                     replay: str = None) -> ApiBalancer:
+    """
+    Balancer shared by all sessions, so that calls in progress are counted for all of them
+
+    Args:
+        urls (tuple[str]): API endpoints
+        record (str): file to record API calls to
+        replay (str): file to replay API calls from, instead of calling the API
+
+    Returns:
+        ApiBalancer, the shared balancer
+    """
+    if replay:
+        return ApiBalancer(urls, ApiTape(replay, "replay"))
+
+    if record:
+        return ApiBalancer(urls, ApiTape(record, "record"))
+
+    return ApiBalancer(urls)
+
+
+def could_not_connect(error: requests.exceptions.ConnectionError) -> bool:
+    """
+    Whether a connection error happened before the call was sent to the API
+
+    Args:
+        error (requests.exceptions.ConnectionError): error raised by requests
+
+    Returns:
+        bool, True if the connection to the API could not be established
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+
+    # requests wraps the urllib3 MaxRetryError, whose reason is the last urllib3 error
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def api_request(method: str,
+                api: ApiBalancer,
+                route: str,
+                data: str = None,
+                hedge: bool = False) -> requests.models.Response:
+    """
+    Calls the API with timeouts, retries, load balancing and circuit breakers.
+    Calls which could not connect are sent to the next endpoint.
+    When replaying, the recorded response is served instead of calling the API.
+
+    Args:
+        method (str): HTTP method, "get" or "post"
+        api (ApiBalancer): API endpoints in use
+        route (str): API route to call
+        data (str): JSON body to send
+        hedge (bool): whether to send a second identical call if the first one is slower than HEDGE_DELAY
+
+    Returns:
+        requests.models.Response, the API response
+
+    Raises:
+        requests.exceptions.RequestException, if the API could not be reached (CircuitOpenError if not even tried)
+    """
+    if api.tape is not None and api.tape.mode == "replay":
+        return api.tape.replay(method, route, data)
+
+    def send() -> requests.models.Response:
+        failed = []
+        error = None
+
+        while True:
+            try:
+                backend = api.acquire(failed)
+            except CircuitOpenError:
+                # Every endpoint allowed to be tried could not connect: raise the real error
+                if error is not None:
+                    raise error
+                raise
+
+            try:
+                response = api.session.request(method,
+                                               f"{backend.url}/{route}",
+                                               data=data,
+                                               timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT))
+
+            except requests.exceptions.ConnectionError as e:
+                backend.breaker.record_failure()
+                # Read timeouts also end up here once retries are exhausted: the call may be processed, don't resend it
+                if not could_not_connect(e):
+                    raise
+                # The call did not reach the API, safe to try another endpoint
+                logging.warning(f"Could not reach API endpoint {backend.url}: {e}")
+                failed.append(backend)
+                error = e
+                continue
+
+            except requests.exceptions.RequestException:
+                backend.breaker.record_failure()
+                raise
+
+            finally:
+                api.release(backend)
+
+            if response.status_code >= 500:
+                backend.breaker.record_failure()
+            else:
+                backend.breaker.record_success()
+
+            return response
+
+    response = hedged(send) if hedge and HEDGE_DELAY is not None else send()
+
+    if api.tape is not None:
+        api.tape.record(method, route, data, response)
+
+    return response
+
+
+def hedged(send) -> requests.models.Response:
+    """
+    Calls send, and calls it a second time if it did not answer after HEDGE_DELAY seconds.
+    The first successful answer is returned.
+
+    Args:
+        send (Callable[[], requests.models.Response]): function performing the API call
+
+    Returns:
+        requests.models.Response, the first answer received
+    """
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    try:
+        futures = [pool.submit(profile_in_thread(send))]
+        done, _ = wait(futures, timeout=HEDGE_DELAY)
+
+        if not done:
+            logging.info(f"No answer after {HEDGE_DELAY}s, sending hedged request")
+            futures.append(pool.submit(profile_in_thread(send)))
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+
+        raise error
+
+    finally:
+        # Do not wait for the slower call
+        pool.shutdown(wait=False)
+
+
+def set_basic_config(page_name: str) -> tuple[ApiBalancer, str, str]:
     """
     Sets basic config such as page name, logs, etc
 
@@ -25,7 +386,7 @@ def set_basic_config(page_name: str) -> tuple[int, str]:
         page_name (str): name of page to be displayed
 
     Returns:
-        tuple, (int, str), (API port used, logs filename)
+        tuple, (ApiBalancer, str, str), (API endpoints used, logs filename, profiles folder or None)
     """
     # Page name
     st.set_page_config(
@@ -39,8 +400,18 @@ def set_basic_config(page_name: str) -> tuple[int, str]:
         "-p",
         "--port",
         action="store",
-        default=8000,
-        help="Specify API port",
+        nargs="+",
+        default=[8000],
+        help="Specify API port(s) on API_HOST",
+        required=False
+    )
+    parser.add_argument(
+        "-a",
+        "--api",
+        action="store",
+        nargs="+",
+        default=None,
+        help="Specify API endpoint(s) as host:port URLs, overrides --port",
         required=False
     )
     parser.add_argument(
@@ -51,6 +422,27 @@ def set_basic_config(page_name: str) -> tuple[int, str]:
         help="Specify output log file",
         required=False
     )
+    parser.add_argument(
+        "--record",
+        action="store",
+        default=None,
+        help="Record all API calls and responses to this file",
+        required=False
+    )
+    parser.add_argument(
+        "--replay",
+        action="store",
+        default=None,
+        help="Replay API responses recorded with --record instead of calling the API",
+        required=False
+    )
+    parser.add_argument(
+        "--profile",
+        action="store",
+        default=None,
+        help="Profile each page run with cProfile, writing one .prof file per run in this folder",
+        required=False
+    )
 
     args = parser.parse_args()
 
@@ -66,15 +458,22 @@ def set_basic_config(page_name: str) -> tuple[int, str]:
 
     logging.info(f"Changed to page {page_name}")
 
-    return args.port, args.log
+    urls = args.api if args.api else [f"{API_HOST}:{port}" for port in args.port]
+
+    api = get_api_balancer(tuple(url.rstrip("/") for url in urls), args.record, args.replay)
+
+    # Needed by fragment reruns, which don't go through the page entry point
+    st.session_state.profile_dir = args.profile
+
+    return api, args.log, args.profile
 
-def get_requests(port: int,
+def get_requests(api: ApiBalancer,
                  filter_on_active: bool = True) -> bool:
     """
     Acquires available clothes requests using our API and put them in st.session_state.
 
     Args:
-        port (int): API port in use
+        api (ApiBalancer): API endpoints in use
         filter_on_active (bool): whether to only filter on active requests (page "Recherche vêtements")
 
     Returns:
@@ -83,7 +482,7 @@ def get_requests(port: int,
     logging.info("Getting requests")
 
     try:
-        available_requests = requests.get(f"{API_HOST}:{port}/{GET_REQUESTS_ROUTE}")
+        available_requests = api_request("get", api, GET_REQUESTS_ROUTE)
 
         # Case error
         if available_requests.status_code != 200:
@@ -112,8 +511,8 @@ def get_requests(port: int,
 
             return True
 
-    except requests.exceptions.ConnectionError:
-        logging.error("API is down! Cannot proceed further")
+    except requests.exceptions.RequestException as e:
+        logging.error(f"API is down! Cannot proceed further: {e}")
         st.write(f"Oops ! L'API semble down.")
         return False
 